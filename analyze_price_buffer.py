@@ -9,129 +9,241 @@ Price log format: timestamp,market,slug,yes_price,no_price,sum
 Example: 2026-01-10T17:13:36.580Z,btc,btc-updown-15m-1768064400,0.9850,0.0150,1.0000
 """
 
+import multiprocessing
+import os
 import sys
-import csv
 from pathlib import Path
-from collections import defaultdict
-import statistics
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:  # Optional: falls back to the NumPy implementation
+    numba = None
+
+PRICE_LOG_COLUMNS = ['timestamp', 'market', 'slug', 'yes', 'no', 'sum']
+BUFFER_CANDIDATES = np.array([0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07, 0.08, 0.09, 0.10], dtype=np.float64)
+DEFAULT_LOWER_BOUNDS = 0.5 - BUFFER_CANDIDATES  # Lower range bounds for the usual 0.5 threshold
+N_BUFFERS = len(BUFFER_CANDIDATES)
+PARALLEL_MIN_PRICE_POINTS = 1_000_000  # Below this, process pool startup outweighs the analysis
+
+class MarketPrices(NamedTuple):
+    """Price points for one market, stored as parallel column arrays."""
+    timestamp: np.ndarray
+    slug: pd.Categorical
+    yes: np.ndarray
+    no: np.ndarray
 
 def parse_price_log(log_file):
-    """Parse price log file and extract price data."""
-    prices_by_market = defaultdict(list)
-    
-    with open(log_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            
-            try:
-                parts = line.split(',')
-                if len(parts) < 5:
-                    continue
-                
-                timestamp = parts[0]
-                market = parts[1]
-                slug = parts[2]
-                yes_price = float(parts[3])
-                no_price = float(parts[4])
-                
-                # Store both YES and NO prices
-                prices_by_market[market].append({
-                    'timestamp': timestamp,
-                    'slug': slug,
-                    'yes': yes_price,
-                    'no': no_price,
-                })
-            except (ValueError, IndexError) as e:
-                # Skip malformed lines
-                continue
-    
-    return prices_by_market
-
-def calculate_price_movements(prices):
-    """Calculate price movement statistics."""
-    if len(prices) < 2:
-        return None
+    """Parse price log file into MarketPrices arrays keyed by market."""
+    # An empty file cannot be memory-mapped
+    if Path(log_file).stat().st_size == 0:
+        return {}
     
-    movements = []
-    for i in range(1, len(prices)):
-        try:
-            prev_yes = prices[i-1]['yes']
-            curr_yes = prices[i]['yes']
-            prev_no = prices[i-1]['no']
-            curr_no = prices[i]['no']
-            
-            # Skip invalid values
-            if not all(isinstance(p, (int, float)) and not (p != p) for p in [prev_yes, curr_yes, prev_no, curr_no]):
-                continue
-            
-            # Calculate absolute price changes
-            yes_change = abs(curr_yes - prev_yes)
-            no_change = abs(curr_no - prev_no)
-            
-            movements.extend([yes_change, no_change])
-        except (TypeError, KeyError, ValueError):
-            continue
+    try:
+        # Only the first five fields are used; the trailing sum is optional
+        df = pd.read_csv(
+            log_file,
+            header=None,
+            names=PRICE_LOG_COLUMNS[:5],
+            usecols=[0, 1, 2, 3, 4],
+            dtype={'timestamp': str, 'market': 'category', 'slug': 'category', 'yes': str, 'no': str},
+            skip_blank_lines=True,
+            on_bad_lines='skip',
+            engine='c',
+            memory_map=True,
+        )
+    except pd.errors.ParserError:
+        # No line has all five fields
+        return {}
     
-    if not movements or len(movements) < 2:
-        return None
+    yes = pd.to_numeric(df['yes'], errors='coerce').to_numpy(dtype=np.float64)
+    no = pd.to_numeric(df['no'], errors='coerce').to_numpy(dtype=np.float64)
     
-    try:
-        return {
-            'mean': statistics.mean(movements),
-            'median': statistics.median(movements),
-            'stdev': statistics.stdev(movements),
-            'min': min(movements),
-            'max': max(movements),
-            'p50': statistics.median(movements),
-            'p75': statistics.quantiles(movements, n=4)[2] if len(movements) > 3 else max(movements),
-            'p90': statistics.quantiles(movements, n=10)[8] if len(movements) > 9 else max(movements),
-            'p95': statistics.quantiles(movements, n=20)[18] if len(movements) > 19 else max(movements),
+    # Malformed prices and short lines come through as NaN; drop them (and
+    # any inf) with one mask so the analysis never needs per-value guards
+    valid = np.isfinite(yes) & np.isfinite(no)
+    df = df[valid]
+    yes = yes[valid]
+    no = no[valid]
+    
+    timestamp = df['timestamp'].to_numpy()
+    slug = df['slug'].array  # Categorical: int codes into the distinct slugs
+    
+    return {
+        market: MarketPrices(timestamp[rows], slug[rows], yes[rows], no[rows])
+        for market, rows in df.groupby('market', sort=False, observed=True).indices.items()
+    }
+
+def _movement_stats(movements):
+    """Summarize an array of absolute price movements.
+    
+    The array is partitioned in place by np.quantile, so callers must not
+    rely on its order afterwards.
+    """
+    mean = movements.mean()
+    # Sample standard deviation reusing the mean rather than recomputing it
+    deviations = movements - mean
+    stdev = np.sqrt(deviations @ deviations / (len(movements) - 1))
+    lowest = movements.min()
+    highest = movements.max()
+    
+    # One introselect partition covers every percentile; no full sort or copy.
+    # 'weibull' is the statistics module's default 'exclusive' method, so
+    # results match statistics.median/quantiles, including small samples.
+    median, p75, p90, p95 = np.quantile(
+        movements, [0.5, 0.75, 0.9, 0.95], method='weibull', overwrite_input=True
+    ).tolist()
+    
+    return {
+        'mean': float(mean),
+        'median': median,
+        'stdev': float(stdev),
+        'min': float(lowest),
+        'max': float(highest),
+        'p50': median,
+        'p75': p75,
+        'p90': p90,
+        'p95': p95,
+    }
+
+def _lower_bounds(threshold):
+    """Lower range bound for each buffer candidate below threshold."""
+    return DEFAULT_LOWER_BOUNDS if threshold == 0.5 else threshold - BUFFER_CANDIDATES
+
+def _range_stats(in_range_counts, max_consecutive, total_count):
+    """Build per-buffer range statistics from in-range counts and streaks."""
+    range_stats = {}
+    for i, buffer in enumerate(BUFFER_CANDIDATES.tolist()):
+        range_stats[buffer] = {
+            'in_range_percent': (int(in_range_counts[i]) / total_count * 100) if total_count > 0 else 0,
+            'max_consecutive': int(max_consecutive[i]),
         }
-    except (statistics.StatisticsError, ValueError):
+    
+    return range_stats
+
+def _price_movements(yes, no):
+    """Absolute price changes between consecutive points for both sides."""
+    return np.concatenate([np.abs(np.diff(yes)), np.abs(np.diff(no))])
+
+def calculate_price_movements(yes, no):
+    """Calculate price movement statistics."""
+    if len(yes) < 2:
         return None
+    
+    return _movement_stats(_price_movements(yes, no))
+
+def _max_consecutive(in_range):
+    """Longest run of True values in each column of a 2-D boolean matrix.
+    
+    Each row's run length is its distance from the most recent False row,
+    found with a running maximum over the False row numbers. Rows are
+    numbered from 1 so a False first row still resets the run.
+    """
+    row = np.arange(1, len(in_range) + 1)[:, None]
+    run_length = np.where(in_range, 0, row)
+    np.maximum.accumulate(run_length, axis=0, out=run_length)
+    np.subtract(row, run_length, out=run_length)
+    return run_length.max(axis=0, initial=0)
 
-def analyze_price_ranges(prices, threshold=0.5):
+def _range_counts(yes, no, threshold):
+    """Per-buffer in-range row counts and longest in-range streaks."""
+    lower_bounds = _lower_bounds(threshold)
+    upper_bound = threshold
+    
+    # Highest price at or below the threshold on either side (-inf if
+    # neither); a side is in range exactly when that price clears the lower
+    # bound, so the (N, buffers) matrix needs a single comparison
+    eligible = np.maximum(
+        np.where(yes <= upper_bound, yes, -np.inf),
+        np.where(no <= upper_bound, no, -np.inf),
+    )
+    in_range = eligible[:, None] >= lower_bounds
+    
+    return in_range.sum(axis=0), _max_consecutive(in_range)
+
+def analyze_price_ranges(yes, no, threshold=0.5):
     """Analyze how often prices stay within ranges around threshold."""
-    if not prices:
+    if len(yes) == 0:
         return None
     
-    buffer_candidates = [0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07, 0.08, 0.09, 0.10]
-    range_stats = {}
-    
-    for buffer in buffer_candidates:
-        lower_bound = threshold - buffer
-        upper_bound = threshold
+    return _range_stats(*_range_counts(yes, no, threshold), len(yes))
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=True, boundscheck=False)
+    def _analyze_kernel(yes, no, lower_bounds, upper_bound):
+        """Compute movements and per-buffer range counts in one pass.
         
-        in_range_count = 0
-        total_count = 0
-        consecutive_in_range = 0
-        max_consecutive = 0
+        N_BUFFERS is a global, so Numba freezes it as a compile-time
+        constant and LLVM can fully unroll the per-buffer loop.
+        """
+        n = len(yes)
+        movements = np.empty(2 * (n - 1), dtype=np.float64)
+        in_range_counts = np.zeros(N_BUFFERS, dtype=np.int64)
+        consecutive = np.zeros(N_BUFFERS, dtype=np.int64)
+        max_consecutive = np.zeros(N_BUFFERS, dtype=np.int64)
         
-        for price_data in prices:
-            yes_price = price_data['yes']
-            no_price = price_data['no']
+        for i in range(n):
+            yes_price = yes[i]
+            no_price = no[i]
             
-            # Check if either price is in range
-            yes_in_range = lower_bound <= yes_price <= upper_bound
-            no_in_range = lower_bound <= no_price <= upper_bound
+            if i > 0:
+                movements[i - 1] = abs(yes_price - yes[i - 1])
+                movements[n - 2 + i] = abs(no_price - no[i - 1])
             
-            if yes_in_range or no_in_range:
-                in_range_count += 1
-                consecutive_in_range += 1
-                max_consecutive = max(max_consecutive, consecutive_in_range)
-            else:
-                consecutive_in_range = 0
-            
-            total_count += 1
+            for b in range(N_BUFFERS):
+                lower_bound = lower_bounds[b]
+                yes_in_range = lower_bound <= yes_price and yes_price <= upper_bound
+                no_in_range = lower_bound <= no_price and no_price <= upper_bound
+                
+                if yes_in_range or no_in_range:
+                    in_range_counts[b] += 1
+                    consecutive[b] += 1
+                    if consecutive[b] > max_consecutive[b]:
+                        max_consecutive[b] = consecutive[b]
+                else:
+                    consecutive[b] = 0
         
-        range_stats[buffer] = {
-            'in_range_percent': (in_range_count / total_count * 100) if total_count > 0 else 0,
-            'max_consecutive': max_consecutive,
-        }
+        return movements, in_range_counts, max_consecutive
+
+def _analyze_market(yes, no, threshold):
+    """Return (movements, in_range_counts, max_consecutive) for one market."""
+    if numba is not None:
+        yes = np.ascontiguousarray(yes)
+        no = np.ascontiguousarray(no)
+        return _analyze_kernel(yes, no, _lower_bounds(threshold), threshold)
     
-    return range_stats
+    return (_price_movements(yes, no), *_range_counts(yes, no, threshold))
+
+def analyze_markets(prices_by_market, threshold=0.5):
+    """Analyze each market separately and merge into combined statistics.
+    
+    Movements and in-range streaks never span two markets. Without Numba,
+    large multi-market logs are split across a process pool; with Numba the
+    compiled kernel runs in-process, since each worker would otherwise pay
+    its own JIT compile.
+    """
+    markets = list(prices_by_market.values())
+    total_count = sum(len(prices.yes) for prices in markets)
+    if total_count == 0:
+        return None, None
+    
+    jobs = [(prices.yes, prices.no, threshold) for prices in markets if len(prices.yes) > 0]
+    if numba is None and len(jobs) > 1 and total_count >= PARALLEL_MIN_PRICE_POINTS:
+        with multiprocessing.Pool(min(len(jobs), os.cpu_count() or 1)) as pool:
+            results = pool.starmap(_analyze_market, jobs)
+    else:
+        results = [_analyze_market(*job) for job in jobs]
+    
+    movements = np.concatenate([result[0] for result in results])
+    in_range_counts = np.sum([result[1] for result in results], axis=0)
+    max_consecutive = np.max([result[2] for result in results], axis=0)
+    
+    movements_stats = _movement_stats(movements) if len(movements) >= 2 else None
+    range_stats = _range_stats(in_range_counts, max_consecutive, total_count)
+    return movements_stats, range_stats
 
 def recommend_buffer(movements_stats, range_stats):
     """Recommend optimal buffer based on analysis."""
@@ -180,67 +292,72 @@ def main():
     
     print(f"\nFound {len(prices_by_market)} market(s)")
     for market, prices in prices_by_market.items():
-        print(f"  {market}: {len(prices)} price points")
+        print(f"  {market}: {len(prices.yes)} price points")
     
-    # Analyze all prices combined
-    all_prices = []
-    for prices in prices_by_market.values():
-        all_prices.extend(prices)
+    total_count = sum(len(prices.yes) for prices in prices_by_market.values())
+    print(f"\nTotal price points: {total_count}")
     
-    print(f"\nTotal price points: {len(all_prices)}")
+    # Movement and range statistics across all markets (assuming threshold = 0.5 for binary markets)
+    movements_stats, range_stats = analyze_markets(prices_by_market, threshold=0.5)
     
-    # Calculate movement statistics
-    print("\n" + "="*60)
-    print("PRICE MOVEMENT ANALYSIS")
-    print("="*60)
-    movements_stats = calculate_price_movements(all_prices)
+    # Build the report and emit it with a single write
+    report = []
+    report.append("\n" + "="*60)
+    report.append("PRICE MOVEMENT ANALYSIS")
+    report.append("="*60)
     
     if movements_stats:
-        print(f"Mean movement:     {movements_stats['mean']:.4f}")
-        print(f"Median movement:   {movements_stats['median']:.4f}")
-        print(f"Std deviation:     {movements_stats['stdev']:.4f}")
-        print(f"Min movement:      {movements_stats['min']:.4f}")
-        print(f"Max movement:      {movements_stats['max']:.4f}")
-        print(f"75th percentile:   {movements_stats['p75']:.4f}")
-        print(f"90th percentile:   {movements_stats['p90']:.4f}")
-        print(f"95th percentile:   {movements_stats['p95']:.4f}")
+        report.extend([
+            f"Mean movement:     {movements_stats['mean']:.4f}",
+            f"Median movement:   {movements_stats['median']:.4f}",
+            f"Std deviation:     {movements_stats['stdev']:.4f}",
+            f"Min movement:      {movements_stats['min']:.4f}",
+            f"Max movement:      {movements_stats['max']:.4f}",
+            f"75th percentile:   {movements_stats['p75']:.4f}",
+            f"90th percentile:   {movements_stats['p90']:.4f}",
+            f"95th percentile:   {movements_stats['p95']:.4f}",
+        ])
     else:
-        print("Insufficient data for movement analysis")
+        report.append("Insufficient data for movement analysis")
     
-    # Analyze price ranges (assuming threshold = 0.5 for binary markets)
-    print("\n" + "="*60)
-    print("PRICE RANGE ANALYSIS (for threshold = 0.5)")
-    print("="*60)
-    range_stats = analyze_price_ranges(all_prices, threshold=0.5)
+    report.append("\n" + "="*60)
+    report.append("PRICE RANGE ANALYSIS (for threshold = 0.5)")
+    report.append("="*60)
     
     if range_stats:
-        print(f"{'Buffer':<10} {'In Range %':<15} {'Max Consecutive':<20}")
-        print("-" * 45)
-        for buffer in sorted(range_stats.keys()):
-            stats = range_stats[buffer]
-            print(f"{buffer:<10.2f} {stats['in_range_percent']:>6.2f}%        {stats['max_consecutive']:<20}")
+        report.append(f"{'Buffer':<10} {'In Range %':<15} {'Max Consecutive':<20}")
+        report.append("-" * 45)
+        report.extend(
+            f"{buffer:<10.2f} {stats['in_range_percent']:>6.2f}%        {stats['max_consecutive']:<20}"
+            for buffer, stats in sorted(range_stats.items())
+        )
     else:
-        print("Insufficient data for range analysis")
+        report.append("Insufficient data for range analysis")
     
     # Recommend buffer
-    print("\n" + "="*60)
-    print("RECOMMENDATION")
-    print("="*60)
+    report.append("\n" + "="*60)
+    report.append("RECOMMENDATION")
+    report.append("="*60)
     recommended = recommend_buffer(movements_stats, range_stats)
-    print(f"\nRecommended TRADE_PRICE_BUFFER: {recommended:.2f}")
-    print(f"\nThis value:")
-    print(f"  - Captures ~75% of typical price movements")
-    print(f"  - Provides a reasonable range for time-based triggers")
-    print(f"  - Balances sensitivity with false trigger prevention")
+    report.extend([
+        f"\nRecommended TRADE_PRICE_BUFFER: {recommended:.2f}",
+        "\nThis value:",
+        "  - Captures ~75% of typical price movements",
+        "  - Provides a reasonable range for time-based triggers",
+        "  - Balances sensitivity with false trigger prevention",
+    ])
     
     if movements_stats:
         median = movements_stats['median']
         p90 = movements_stats['p90']
-        print(f"\nAlternative considerations:")
-        print(f"  - More conservative (median): {median:.2f} - captures 50% of movements")
-        print(f"  - More aggressive (p90): {p90:.2f} - captures 90% of movements")
+        report.extend([
+            "\nAlternative considerations:",
+            f"  - More conservative (median): {median:.2f} - captures 50% of movements",
+            f"  - More aggressive (p90): {p90:.2f} - captures 90% of movements",
+        ])
     
-    print("\n" + "="*60)
+    report.append("\n" + "="*60)
+    sys.stdout.write("\n".join(report) + "\n")
 
 if __name__ == '__main__':
     main()